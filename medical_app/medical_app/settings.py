@@ -57,6 +57,24 @@ DATABASES = {
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+JSON_STORAGE_FORMAT = 'plain'
+
+JSON_RECONCILE_STATE_FILE = os.path.join(BASE_DIR, 'json_reconcile_state.json')
+
+RECORD_ARCHIVE_AGE_DAYS = 365
+
+BACKUP_DIR = os.path.join(BASE_DIR, 'backups')
+
+RECORD_WRITE_BEHIND = False
+RECORD_WRITE_BEHIND_BATCH_SIZE = 100
+RECORD_WRITE_BEHIND_MAX_DELAY = 0.005
+RECORD_WRITE_BEHIND_QUEUE_SIZE = 10000
+RECORD_WRITE_BEHIND_ACK = 'commit'
+RECORD_WRITE_BEHIND_ACK_TIMEOUT = 5.0
+
+SEARCH_CACHE_TTL = 1.0
+SEARCH_CACHE_MAX_ENTRIES = 1000
+
 STATIC_URL = '/static/'
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'medical_data', 'static')]
 
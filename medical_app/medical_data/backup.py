@@ -0,0 +1,67 @@
+import os
+import shutil
+import sqlite3
+from pathlib import Path
+from django.conf import settings
+from django.core.management.base import CommandError
+
+MANIFEST_NAME = 'manifest.json'
+DATABASE_NAME = 'db.sqlite3'
+MEDIA_SUBDIR = 'media'
+
+
+def get_database_path(alias='default'):
+    database = settings.DATABASES[alias]
+    if database['ENGINE'] != 'django.db.backends.sqlite3':
+        raise CommandError('Поддерживается только база данных SQLite.')
+    return str(database['NAME'])
+
+
+def sqlite_copy(src_path, dst_path):
+    # Весь файл копируется за один шаг, то есть в одной читающей транзакции:
+    # при пошаговом копировании SQLite начинает заново после каждой записи
+    # в исходную базу и под нагрузкой не завершается.
+    if not os.path.isfile(src_path):
+        raise CommandError(f'Файл базы данных не найден: {src_path}')
+    src = sqlite3.connect(f'{Path(src_path).absolute().as_uri()}?mode=ro', uri=True)
+    try:
+        dst = sqlite3.connect(dst_path)
+        try:
+            src.backup(dst, pages=-1)
+        finally:
+            dst.close()
+    finally:
+        src.close()
+
+
+def snapshot_file(src_path, dst_path):
+    os.makedirs(os.path.dirname(dst_path), exist_ok=True)
+    try:
+        os.link(src_path, dst_path)
+    except OSError:
+        shutil.copy2(src_path, dst_path)
+
+
+def restore_file(src_path, dst_path):
+    os.makedirs(os.path.dirname(dst_path), exist_ok=True)
+    tmp_path = f"{dst_path}.tmp"
+    shutil.copy2(src_path, tmp_path)
+    os.replace(tmp_path, dst_path)
+
+
+def media_target_path(media_root, relpath):
+    root = os.path.realpath(media_root)
+    path = os.path.realpath(os.path.join(root, relpath))
+    if os.path.commonpath([root, path]) != root or path == root:
+        raise CommandError(f'Недопустимый путь в манифесте: {relpath}')
+    return path
+
+
+def iter_media_files(media_root):
+    for root, dirs, files in os.walk(media_root):
+        dirs.sort()
+        for name in sorted(files):
+            if name.endswith('.tmp'):
+                continue
+            path = os.path.join(root, name)
+            yield os.path.relpath(path, media_root), path
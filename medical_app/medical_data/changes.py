@@ -0,0 +1,51 @@
+import threading
+from contextlib import contextmanager
+from .models import RecordChange
+from .json_store import RECORD_FIELDS
+
+_local = threading.local()
+
+
+@contextmanager
+def signals_suppressed():
+    previous = getattr(_local, 'suppressed', False)
+    _local.suppressed = True
+    try:
+        yield
+    finally:
+        _local.suppressed = previous
+
+
+def is_suppressed():
+    return getattr(_local, 'suppressed', False)
+
+
+def record_snapshot(record):
+    return {
+        'id': str(record.id),
+        **{field: getattr(record, field) for field in RECORD_FIELDS},
+        'created_at': record.created_at.isoformat(),
+        'data_source': record.data_source,
+    }
+
+
+def log_changes(records, action):
+    RecordChange.objects.bulk_create([
+        RecordChange(
+            record_id=record.id,
+            action=action,
+            data=None if action in (RecordChange.ACTION_DELETE, RecordChange.ACTION_ARCHIVE)
+            else record_snapshot(record),
+        )
+        for record in records
+    ])
+
+
+def change_to_dict(change):
+    return {
+        'seq': change.seq,
+        'record_id': str(change.record_id),
+        'action': change.action,
+        'data': change.data,
+        'changed_at': change.changed_at.isoformat(),
+    }
@@ -0,0 +1,15 @@
+from django.conf import settings
+from django.core.checks import Error, register
+from .json_store import STORAGE_FORMATS
+
+
+@register()
+def check_json_storage_format(app_configs, **kwargs):
+    storage_format = getattr(settings, 'JSON_STORAGE_FORMAT', 'plain')
+    if storage_format in STORAGE_FORMATS:
+        return []
+    return [Error(
+        f'Неизвестный формат хранения JSON_STORAGE_FORMAT: {storage_format!r}',
+        hint=f'Допустимые значения: {", ".join(STORAGE_FORMATS)}',
+        id='medical_data.E001',
+    )]
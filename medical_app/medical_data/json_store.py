@@ -0,0 +1,191 @@
+import os
+import gzip
+import json
+import lzma
+import uuid
+import hashlib
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+JSON_SUBDIR = 'medical_json'
+RECORD_FILE_PREFIX = 'medical_record_'
+
+STORAGE_FORMATS = {
+    'plain': ('.json', open),
+    'gzip': ('.json.gz', gzip.open),
+    'lzma': ('.json.xz', lzma.open),
+}
+
+JSON_READ_ERRORS = (json.JSONDecodeError, UnicodeDecodeError, EOFError, lzma.LZMAError, OSError)
+
+REQUIRED_FIELDS = ['patient_name', 'age', 'gender', 'height', 'weight']
+
+RECORD_FIELDS = [
+    'patient_name', 'age', 'gender', 'height', 'weight',
+    'blood_pressure', 'heart_rate', 'temperature', 'symptoms', 'diagnosis',
+]
+
+DUPLICATE_FIELDS = ['patient_name', 'age', 'gender', 'height', 'weight', 'diagnosis']
+
+
+def duplicate_key(record):
+    return tuple(getattr(record, field) for field in DUPLICATE_FIELDS)
+
+
+def get_json_dir():
+    return os.path.join(settings.MEDIA_ROOT, JSON_SUBDIR)
+
+
+def get_storage_format():
+    return getattr(settings, 'JSON_STORAGE_FORMAT', 'plain')
+
+
+def storage_format_for(filename):
+    for storage_format, (ext, _) in STORAGE_FORMATS.items():
+        if storage_format != 'plain' and filename.endswith(ext):
+            return storage_format
+    if filename.endswith('.json'):
+        return 'plain'
+    return None
+
+
+def is_json_filename(filename):
+    return storage_format_for(filename) is not None
+
+
+def record_filename(record_id, storage_format='plain'):
+    ext = STORAGE_FORMATS[storage_format][0]
+    return f"{RECORD_FILE_PREFIX}{record_id}{ext}"
+
+
+def record_id_from_filename(filename):
+    stem = filename.split('.', 1)[0]
+    if not stem.startswith(RECORD_FILE_PREFIX):
+        return None
+    try:
+        return uuid.UUID(stem[len(RECORD_FILE_PREFIX):])
+    except ValueError:
+        return None
+
+
+def file_checksum(path, chunk_size=64 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def open_json_file(path, mode='rt', storage_format=None):
+    opener = STORAGE_FORMATS[storage_format or storage_format_for(path) or 'plain'][1]
+    return opener(path, mode, encoding='utf-8')
+
+
+def read_json_file(path):
+    with open_json_file(path) as f:
+        return json.load(f)
+
+
+def write_json_file(path, data, storage_format=None):
+    storage_format = storage_format or storage_format_for(path) or 'plain'
+    tmp_path = f"{path}.tmp"
+    with open_json_file(tmp_path, 'wt', storage_format) as f:
+        if storage_format == 'plain':
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        else:
+            json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+
+def write_record_file(data, storage_format=None):
+    storage_format = storage_format or get_storage_format()
+    json_dir = get_json_dir()
+    os.makedirs(json_dir, exist_ok=True)
+    filename = record_filename(data['id'], storage_format)
+    write_json_file(os.path.join(json_dir, filename), data, storage_format)
+    return filename
+
+
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _check_text(data, field, max_length=None):
+    value = data.get(field)
+    if value is None:
+        return
+    if not isinstance(value, str):
+        raise ValueError(f"Поле {field} должно быть строкой")
+    if max_length and len(value) > max_length:
+        raise ValueError(f"Поле {field} не может быть длиннее {max_length} символов")
+
+
+def validate_record_data(data):
+    if not isinstance(data, dict):
+        raise ValueError("Ожидался JSON объект")
+    for field in REQUIRED_FIELDS:
+        if field not in data:
+            raise ValueError(f"Отсутствует обязательное поле: {field}")
+
+    _check_text(data, 'patient_name', 100)
+    if not data['patient_name'] or not data['patient_name'].strip():
+        raise ValueError("Имя пациента не может быть пустым")
+    if not _is_int(data['age']) or not 0 <= data['age'] <= 150:
+        raise ValueError("Возраст должен быть целым числом от 0 до 150")
+    if data['gender'] not in ('M', 'F'):
+        raise ValueError("Пол должен быть 'M' или 'F'")
+    for field in ('height', 'weight'):
+        if not _is_number(data[field]) or data[field] <= 0:
+            raise ValueError(f"Поле {field} должно быть положительным числом")
+    heart_rate = data.get('heart_rate')
+    if heart_rate is not None and (not _is_int(heart_rate) or heart_rate < 0):
+        raise ValueError("ЧСС должна быть неотрицательным целым числом")
+    temperature = data.get('temperature')
+    if temperature is not None and not _is_number(temperature):
+        raise ValueError("Температура должна быть числом")
+    _check_text(data, 'blood_pressure', 10)
+    _check_text(data, 'symptoms')
+    _check_text(data, 'diagnosis', 200)
+    _check_text(data, 'created_at')
+    _check_text(data, 'id')
+
+
+def load_record_file(path):
+    try:
+        data = read_json_file(path)
+        validate_record_data(data)
+    except JSON_READ_ERRORS + (ValueError,) as e:
+        return path, None, str(e)
+    return path, data, None
+
+
+def content_checksum(data):
+    content = json.dumps(data, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def record_kwargs(data):
+    validate_record_data(data)
+
+    created_at = None
+    if data.get('created_at'):
+        created_at = parse_datetime(data['created_at'])
+
+    return {
+        'patient_name': data['patient_name'],
+        'age': data['age'],
+        'gender': data['gender'],
+        'height': data['height'],
+        'weight': data['weight'],
+        'blood_pressure': data.get('blood_pressure') or '',
+        'heart_rate': data.get('heart_rate') or 0,
+        'temperature': data.get('temperature') or 36.6,
+        'symptoms': data.get('symptoms') or '',
+        'diagnosis': data.get('diagnosis') or '',
+        'created_at': created_at or timezone.now(),
+    }
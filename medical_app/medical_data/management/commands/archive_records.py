@@ -0,0 +1,63 @@
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from medical_data.changes import log_changes, signals_suppressed
+from medical_data.json_store import RECORD_FIELDS
+from medical_data.models import MedicalRecord, ArchivedMedicalRecord, RecordChange
+
+
+class Command(BaseCommand):
+    help = 'Переносит старые медицинские записи в архив'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=settings.RECORD_ARCHIVE_AGE_DAYS,
+            help='Переносить записи старше указанного количества дней'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Количество записей в одной транзакции'
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        fields = [field.attname for field in MedicalRecord._meta.concrete_fields]
+
+        total = 0
+        while True:
+            with transaction.atomic():
+                batch = list(
+                    MedicalRecord.objects.filter(created_at__lt=cutoff)
+                    .order_by('created_at')[:options['batch_size']]
+                )
+                if not batch:
+                    break
+
+                archived_at = timezone.now()
+                ArchivedMedicalRecord.objects.bulk_create(
+                    [
+                        ArchivedMedicalRecord(
+                            **{field: getattr(record, field) for field in fields},
+                            archived_at=archived_at
+                        )
+                        for record in batch
+                    ],
+                    update_conflicts=True,
+                    unique_fields=['id'],
+                    update_fields=RECORD_FIELDS + ['archived_at'],
+                )
+                with signals_suppressed():
+                    MedicalRecord.objects.filter(id__in=[record.id for record in batch]).delete()
+                log_changes(batch, RecordChange.ACTION_ARCHIVE)
+
+            total += len(batch)
+            self.stdout.write(f'  Перенесено в архив: {total}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Архивация завершена: {total} записей старше {cutoff:%d.%m.%Y} '
+            f'за {time.monotonic() - started:.2f} с'
+        ))
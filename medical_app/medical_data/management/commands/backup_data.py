@@ -0,0 +1,69 @@
+import os
+import json
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from medical_data.backup import (
+    DATABASE_NAME, MANIFEST_NAME, MEDIA_SUBDIR, get_database_path, iter_media_files,
+    snapshot_file, sqlite_copy,
+)
+from medical_data.json_store import file_checksum
+
+
+class Command(BaseCommand):
+    help = 'Создает резервную копию базы данных и медиафайлов без остановки приложения'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output', default=None,
+            help='Каталог для резервной копии (по умолчанию BACKUP_DIR/<дата-время>)'
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        created_at = timezone.now()
+        output = options['output'] or os.path.join(
+            settings.BACKUP_DIR, created_at.strftime('%Y%m%d-%H%M%S')
+        )
+        if os.path.exists(os.path.join(output, MANIFEST_NAME)):
+            raise CommandError(f'Резервная копия уже существует: {output}')
+        os.makedirs(output, exist_ok=True)
+
+        db_backup_path = os.path.join(output, DATABASE_NAME)
+        sqlite_copy(get_database_path(), db_backup_path)
+
+        media_files = []
+        if os.path.isdir(settings.MEDIA_ROOT):
+            for relpath, path in iter_media_files(settings.MEDIA_ROOT):
+                backup_path = os.path.join(output, MEDIA_SUBDIR, relpath)
+                try:
+                    snapshot_file(path, backup_path)
+                except FileNotFoundError:
+                    continue
+                stat = os.stat(backup_path)
+                media_files.append({
+                    'path': relpath,
+                    'size': stat.st_size,
+                    'mtime_ns': stat.st_mtime_ns,
+                    'sha256': file_checksum(backup_path),
+                })
+
+        manifest = {
+            'created_at': created_at.isoformat(),
+            'database': {
+                'path': DATABASE_NAME,
+                'size': os.path.getsize(db_backup_path),
+                'sha256': file_checksum(db_backup_path),
+            },
+            'media': media_files,
+        }
+        tmp_path = os.path.join(output, f'{MANIFEST_NAME}.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, os.path.join(output, MANIFEST_NAME))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Резервная копия создана в {output}: медиафайлов {len(media_files)}, '
+            f'за {time.monotonic() - started:.2f} с'
+        ))
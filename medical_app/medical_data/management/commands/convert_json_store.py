@@ -0,0 +1,64 @@
+import os
+import time
+from django.core.management.base import BaseCommand
+from medical_data.json_store import (
+    JSON_READ_ERRORS, STORAGE_FORMATS, get_json_dir, get_storage_format, record_filename,
+    record_id_from_filename, storage_format_for, read_json_file, write_json_file,
+)
+
+
+class Command(BaseCommand):
+    help = 'Конвертирует JSON файлы записей в заданный формат хранения'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--format', choices=list(STORAGE_FORMATS), default=None,
+            help='Целевой формат (по умолчанию JSON_STORAGE_FORMAT из настроек)'
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        target = options['format'] or get_storage_format()
+        json_dir = get_json_dir()
+
+        if not os.path.isdir(json_dir):
+            self.stdout.write('Папка с JSON файлами не существует.')
+            return
+
+        converted = skipped = errors = 0
+        size_before = size_after = 0
+        with os.scandir(json_dir) as entries:
+            names = [entry.name for entry in entries if entry.is_file()]
+
+        for name in names:
+            storage_format = storage_format_for(name)
+            record_id = record_id_from_filename(name)
+            if storage_format is None or record_id is None:
+                continue
+            if storage_format == target:
+                skipped += 1
+                continue
+
+            path = os.path.join(json_dir, name)
+            new_path = os.path.join(json_dir, record_filename(record_id, target))
+            try:
+                data = read_json_file(path)
+            except JSON_READ_ERRORS as e:
+                errors += 1
+                self.stderr.write(f'Ошибка в файле {name}: {e}')
+                continue
+
+            size_before += os.path.getsize(path)
+            write_json_file(new_path, data, target)
+            size_after += os.path.getsize(new_path)
+            os.remove(path)
+            converted += 1
+
+        self.stdout.write(
+            f'Сконвертировано файлов: {converted}, уже в формате {target}: {skipped}, ошибок: {errors}'
+        )
+        if converted:
+            self.stdout.write(f'Размер: {size_before} -> {size_after} байт')
+        self.stdout.write(self.style.SUCCESS(
+            f'Конвертация завершена за {time.monotonic() - started:.2f} с'
+        ))
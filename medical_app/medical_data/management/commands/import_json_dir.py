@@ -0,0 +1,138 @@
+import os
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from medical_data.changes import log_changes
+from medical_data.json_store import (
+    DUPLICATE_FIELDS, duplicate_key, is_json_filename, load_record_file, record_kwargs,
+)
+from medical_data.models import MedicalRecord, ArchivedMedicalRecord, RecordChange
+
+STATE_FILENAME = '.import_json_dir.done'
+
+
+class Command(BaseCommand):
+    help = 'Импортирует JSON файлы медицинских записей из каталога'
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory', help='Каталог с JSON файлами')
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='Количество процессов для разбора файлов'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=500,
+            help='Количество записей в одной транзакции'
+        )
+        parser.add_argument(
+            '--state-file', default=None,
+            help=f'Файл с уже обработанными файлами (по умолчанию {STATE_FILENAME} в каталоге импорта)'
+        )
+        parser.add_argument(
+            '--restart', action='store_true',
+            help='Начать импорт заново, игнорируя сохраненный прогресс'
+        )
+
+    def handle(self, *args, **options):
+        directory = os.path.abspath(options['directory'])
+        if not os.path.isdir(directory):
+            raise CommandError(f'Каталог не найден: {directory}')
+
+        state_path = options['state_file'] or os.path.join(directory, STATE_FILENAME)
+        done = set()
+        if os.path.exists(state_path) and not options['restart']:
+            with open(state_path, 'r', encoding='utf-8') as f:
+                done = {line.rstrip('\n') for line in f if line.strip()}
+        elif options['restart'] and os.path.exists(state_path):
+            os.remove(state_path)
+
+        paths = []
+        for root, dirs, files in os.walk(directory):
+            dirs.sort()
+            for name in sorted(files):
+                path = os.path.join(root, name)
+                if is_json_filename(name) and os.path.relpath(path, directory) not in done:
+                    paths.append(path)
+
+        self.stdout.write(f'Файлов к импорту: {len(paths)}, уже обработано ранее: {len(done)}')
+        if not paths:
+            return
+
+        self.started = time.monotonic()
+        self.directory = directory
+        self.stats = {'files': 0, 'created': 0, 'duplicates': 0, 'errors': 0}
+        self.seen_keys = set()
+        self.seen_ids = set()
+
+        with open(state_path, 'a', encoding='utf-8') as state, \
+                ProcessPoolExecutor(max_workers=options['workers']) as executor:
+            chunk = []
+            processed = []
+            for path, data, error in executor.map(load_record_file, paths, chunksize=64):
+                processed.append(path)
+                if error is not None:
+                    self.stats['errors'] += 1
+                    self.stderr.write(f'Ошибка в файле {os.path.relpath(path, directory)}: {error}')
+                else:
+                    try:
+                        record_id = uuid.UUID(data['id']) if data.get('id') else uuid.uuid4()
+                        chunk.append(MedicalRecord(id=record_id, data_source='file', **record_kwargs(data)))
+                    except (ValueError, TypeError, AttributeError) as e:
+                        self.stats['errors'] += 1
+                        self.stderr.write(f'Ошибка в файле {os.path.relpath(path, directory)}: {e}')
+
+                if len(processed) >= options['chunk_size']:
+                    self.flush(chunk, processed, state)
+                    chunk, processed = [], []
+
+            self.flush(chunk, processed, state)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Импорт завершен: создано {self.stats["created"]}, дубликатов {self.stats["duplicates"]}, '
+            f'ошибок {self.stats["errors"]} за {time.monotonic() - self.started:.2f} с'
+        ))
+
+    def flush(self, records, processed, state):
+        if not processed:
+            return
+
+        if records:
+            record_ids = [record.id for record in records]
+            existing_ids = set(MedicalRecord.objects.filter(
+                id__in=record_ids
+            ).values_list('id', flat=True))
+            existing_ids.update(ArchivedMedicalRecord.objects.filter(
+                id__in=record_ids
+            ).values_list('id', flat=True))
+            existing_keys = set(MedicalRecord.objects.filter(
+                patient_name__in={record.patient_name for record in records}
+            ).values_list(*DUPLICATE_FIELDS))
+
+            new_records = []
+            for record in records:
+                key = duplicate_key(record)
+                if (record.id in existing_ids or record.id in self.seen_ids
+                        or key in existing_keys or key in self.seen_keys):
+                    self.stats['duplicates'] += 1
+                    continue
+                self.seen_keys.add(key)
+                self.seen_ids.add(record.id)
+                new_records.append(record)
+
+            with transaction.atomic():
+                MedicalRecord.objects.bulk_create(new_records)
+                log_changes(new_records, RecordChange.ACTION_CREATE)
+            self.stats['created'] += len(new_records)
+
+        state.writelines(f'{os.path.relpath(path, self.directory)}\n' for path in processed)
+        state.flush()
+        os.fsync(state.fileno())
+
+        self.stats['files'] += len(processed)
+        elapsed = max(time.monotonic() - self.started, 0.001)
+        self.stdout.write(
+            f'  Обработано файлов: {self.stats["files"]} '
+            f'({self.stats["files"] / elapsed:.0f} файлов/с, {self.stats["created"] / elapsed:.0f} записей/с)'
+        )
@@ -0,0 +1,197 @@
+import os
+import json
+import time
+import uuid
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from medical_data.json_store import (
+    JSON_READ_ERRORS, RECORD_FIELDS, get_json_dir, get_storage_format, is_json_filename,
+    record_filename, record_id_from_filename, content_checksum, read_json_file, record_kwargs,
+)
+from medical_data.changes import log_changes
+from medical_data.models import MedicalRecord, ArchivedMedicalRecord, RecordChange
+
+CHECKPOINT_INTERVAL = 5.0
+
+
+def load_state(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        state = {}
+    state.setdefault('files', {})
+    state.setdefault('missing', {})
+    return state
+
+
+def save_state(path, state):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
+
+
+class Command(BaseCommand):
+    help = 'Инкрементальная сверка JSON файлов записей с базой данных'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full', action='store_true',
+            help='Перечитать все файлы, не доверяя размеру и времени изменения из манифеста'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Количество записей в одной транзакции'
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        run_started = timezone.now()
+        state_path = settings.JSON_RECONCILE_STATE_FILE
+        state = load_state(state_path)
+        files = state['files']
+        json_dir = get_json_dir()
+
+        if not os.path.isdir(json_dir):
+            self.stdout.write('Папка с JSON файлами не существует.')
+            return
+
+        seen = set()
+        changed = []
+        with os.scandir(json_dir) as entries:
+            for entry in entries:
+                if (not entry.is_file() or not is_json_filename(entry.name)
+                        or record_id_from_filename(entry.name) is None):
+                    continue
+                seen.add(entry.name)
+                stat = entry.stat()
+                known = files.get(entry.name)
+                if (not options['full'] and known
+                        and known['mtime_ns'] == stat.st_mtime_ns
+                        and known['size'] == stat.st_size):
+                    continue
+                changed.append((entry.name, entry.path, stat))
+
+        known_checksums = {}
+        for known in files.values():
+            if known.get('record_id'):
+                known_checksums.setdefault(known['record_id'], set()).add(known['sha256'])
+
+        created = updated = unchanged = archived = errors = 0
+        checkpointed = time.monotonic()
+        batch_size = options['batch_size']
+        for start in range(0, len(changed), batch_size):
+            records = {}
+            pending = {}
+            for name, path, stat in changed[start:start + batch_size]:
+                entry = {
+                    'mtime_ns': stat.st_mtime_ns,
+                    'size': stat.st_size,
+                }
+                try:
+                    data = read_json_file(path)
+                    kwargs = record_kwargs(data)
+                    record_id = uuid.UUID(data['id']) if data.get('id') else record_id_from_filename(name)
+                except JSON_READ_ERRORS + (ValueError, TypeError, AttributeError) as e:
+                    errors += 1
+                    self.stderr.write(f'Ошибка в файле {name}: {e}')
+                    pending[name] = {**entry, 'sha256': None, 'record_id': None}
+                    continue
+
+                entry['sha256'] = content_checksum(data)
+                entry['record_id'] = str(record_id)
+                if entry['sha256'] in known_checksums.get(entry['record_id'], ()):
+                    files[name] = entry
+                    unchanged += 1
+                    continue
+
+                records[record_id] = MedicalRecord(id=record_id, data_source='file', **kwargs)
+                pending[name] = entry
+
+            archived_ids = set(ArchivedMedicalRecord.objects.filter(
+                id__in=records.keys()
+            ).values_list('id', flat=True))
+            for record_id in archived_ids:
+                del records[record_id]
+            archived += len(archived_ids)
+
+            if records:
+                existing = set(MedicalRecord.objects.filter(
+                    id__in=records.keys()
+                ).values_list('id', flat=True))
+                with transaction.atomic():
+                    MedicalRecord.objects.bulk_create(
+                        records.values(),
+                        update_conflicts=True,
+                        unique_fields=['id'],
+                        update_fields=RECORD_FIELDS,
+                    )
+                    log_changes(
+                        [r for r in records.values() if r.id not in existing],
+                        RecordChange.ACTION_CREATE
+                    )
+                    log_changes(
+                        [r for r in records.values() if r.id in existing],
+                        RecordChange.ACTION_UPDATE
+                    )
+                created += len(records) - len(existing)
+                updated += len(existing)
+
+            files.update(pending)
+            for entry in pending.values():
+                if entry['record_id']:
+                    known_checksums.setdefault(entry['record_id'], set()).add(entry['sha256'])
+                    state['missing'].pop(entry['record_id'], None)
+            if time.monotonic() - checkpointed >= CHECKPOINT_INTERVAL:
+                save_state(state_path, state)
+                checkpointed = time.monotonic()
+
+        removed = set(files) - seen
+        removed_entries = [(name, files.pop(name)) for name in removed]
+        live_ids = {known.get('record_id') for known in files.values()}
+        for name, known in removed_entries:
+            if known.get('record_id') and known['record_id'] not in live_ids:
+                state['missing'][known['record_id']] = name
+
+        present_ids = {str(record_id_from_filename(name)) for name in seen}
+        present_ids.update(known['record_id'] for known in files.values() if known.get('record_id'))
+        file_records = MedicalRecord.objects.filter(data_source__in=['file', 'both'])
+        last_run = parse_datetime(state.get('last_run') or '')
+        if last_run:
+            file_records = file_records.filter(created_at__gte=last_run)
+        for record_id in file_records.values_list('id', flat=True).iterator():
+            if str(record_id) not in present_ids:
+                state['missing'].setdefault(
+                    str(record_id), record_filename(record_id, get_storage_format())
+                )
+
+        missing = state['missing']
+        orphans = MedicalRecord.objects.filter(id__in=list(missing)).order_by('created_at')
+        orphan_ids = set()
+        for record in orphans:
+            orphan_ids.add(str(record.id))
+            self.stdout.write(
+                f'  Нет файла {missing[str(record.id)]} для записи {record.id} ({record.patient_name})'
+            )
+        state['missing'] = {
+            record_id: name for record_id, name in missing.items() if record_id in orphan_ids
+        }
+        state['last_run'] = run_started.isoformat()
+        save_state(state_path, state)
+
+        self.stdout.write(
+            f'Просканировано файлов: {len(seen)}, изменено: {len(changed)}, '
+            f'без изменений содержимого: {unchanged}'
+        )
+        self.stdout.write(
+            f'Добавлено записей: {created}, обновлено: {updated}, '
+            f'пропущено архивных: {archived}, ошибок: {errors}'
+        )
+        self.stdout.write(f'Записей без файлов: {len(orphan_ids)}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Сверка завершена за {time.monotonic() - started:.2f} с'
+        ))
@@ -0,0 +1,76 @@
+import os
+import json
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from medical_data.backup import (
+    MANIFEST_NAME, MEDIA_SUBDIR, get_database_path, iter_media_files, media_target_path,
+    restore_file, sqlite_copy,
+)
+from medical_data.json_store import file_checksum
+
+
+class Command(BaseCommand):
+    help = 'Восстанавливает базу данных и медиафайлы из резервной копии'
+
+    def add_arguments(self, parser):
+        parser.add_argument('backup', help='Каталог резервной копии')
+        parser.add_argument(
+            '--no-verify', action='store_true',
+            help='Не проверять контрольные суммы перед восстановлением'
+        )
+        parser.add_argument(
+            '--prune', action='store_true',
+            help='Удалить медиафайлы, которых нет в резервной копии'
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        backup_dir = options['backup']
+        manifest_path = os.path.join(backup_dir, MANIFEST_NAME)
+        if not os.path.isfile(manifest_path):
+            raise CommandError(f'Не найден манифест резервной копии: {manifest_path}')
+
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+
+        db_backup_path = os.path.join(backup_dir, manifest['database']['path'])
+        targets = {
+            entry['path']: media_target_path(settings.MEDIA_ROOT, entry['path'])
+            for entry in manifest['media']
+        }
+        if not os.path.isfile(db_backup_path):
+            raise CommandError(f'Файл резервной копии отсутствует: {db_backup_path}')
+        if not options['no_verify']:
+            entries = [(db_backup_path, manifest['database'])] + [
+                (os.path.join(backup_dir, MEDIA_SUBDIR, entry['path']), entry)
+                for entry in manifest['media']
+            ]
+            for path, entry in entries:
+                if not os.path.isfile(path) or file_checksum(path) != entry['sha256']:
+                    raise CommandError(f'Файл резервной копии поврежден или отсутствует: {path}')
+
+        connections.close_all()
+        sqlite_copy(db_backup_path, get_database_path())
+
+        restored = set()
+        for entry in manifest['media']:
+            restore_file(
+                os.path.join(backup_dir, MEDIA_SUBDIR, entry['path']),
+                targets[entry['path']]
+            )
+            restored.add(entry['path'])
+
+        pruned = 0
+        if options['prune'] and os.path.isdir(settings.MEDIA_ROOT):
+            for relpath, path in list(iter_media_files(settings.MEDIA_ROOT)):
+                if relpath not in restored:
+                    os.remove(path)
+                    pruned += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Восстановлено из {backup_dir} (копия от {manifest["created_at"]}): '
+            f'медиафайлов {len(restored)}, удалено лишних {pruned}, '
+            f'за {time.monotonic() - started:.2f} с'
+        ))
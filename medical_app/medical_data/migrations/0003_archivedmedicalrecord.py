@@ -0,0 +1,47 @@
+# Generated by Django 5.2.6 on 2026-10-19 04:04
+
+import django.utils.timezone
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medical_data', '0002_recordchange'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedMedicalRecord',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('patient_name', models.CharField(max_length=100, verbose_name='Имя пациента')),
+                ('age', models.PositiveIntegerField(verbose_name='Возраст')),
+                ('gender', models.CharField(choices=[('M', 'Мужской'), ('F', 'Женский')], max_length=1, verbose_name='Пол')),
+                ('height', models.FloatField(verbose_name='Рост (см)')),
+                ('weight', models.FloatField(verbose_name='Вес (кг)')),
+                ('blood_pressure', models.CharField(max_length=10, verbose_name='Артериальное давление')),
+                ('heart_rate', models.PositiveIntegerField(verbose_name='Частота сердечных сокращений')),
+                ('temperature', models.FloatField(verbose_name='Температура тела (°C)')),
+                ('symptoms', models.TextField(verbose_name='Симптомы')),
+                ('diagnosis', models.CharField(max_length=200, verbose_name='Диагноз')),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('data_source', models.CharField(choices=[('db', 'База данных'), ('file', 'Файл')], default='db', max_length=10)),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.AlterField(
+            model_name='medicalrecord',
+            name='created_at',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+        migrations.AlterField(
+            model_name='recordchange',
+            name='action',
+            field=models.CharField(choices=[('create', 'Создание'), ('update', 'Изменение'), ('delete', 'Удаление'), ('archive', 'Перенос в архив')], max_length=10, verbose_name='Действие'),
+        ),
+    ]
@@ -14,7 +14,7 @@ def medical_json_file_path(instance, filename):
     filename = f"medical_data_{uuid.uuid4()}{ext}"
     return os.path.join('medical_json', filename)
 
-class MedicalRecord(models.Model):
+class MedicalRecordBase(models.Model):
     GENDER_CHOICES = [
         ('M', 'Мужской'),
         ('F', 'Женский'),
@@ -31,13 +31,16 @@ class MedicalRecord(models.Model):
     temperature = models.FloatField(verbose_name="Температура тела (°C)")
     symptoms = models.TextField(verbose_name="Симптомы")
     diagnosis = models.CharField(max_length=200, verbose_name="Диагноз")
-    created_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
     data_source = models.CharField(
         max_length=10, 
         choices=[('db', 'База данных'), ('file', 'Файл')],
         default='db'
     )
     
+    class Meta:
+        abstract = True
+    
     def __str__(self):
         return f"{self.patient_name} - {self.diagnosis}"
     
@@ -47,6 +50,12 @@ class MedicalRecord(models.Model):
             return round(self.weight / ((self.height / 100) ** 2), 2)
         return 0
 
+class MedicalRecord(MedicalRecordBase):
+    pass
+
+class ArchivedMedicalRecord(MedicalRecordBase):
+    archived_at = models.DateTimeField(default=timezone.now)
+
 class JSONFile(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     file = models.FileField(
@@ -64,3 +73,27 @@ class JSONFile(models.Model):
         if self.file and os.path.isfile(self.file.path):
             os.remove(self.file.path)
         super().delete(*args, **kwargs)
+
+class RecordChange(models.Model):
+    ACTION_CREATE = 'create'
+    ACTION_UPDATE = 'update'
+    ACTION_DELETE = 'delete'
+    ACTION_ARCHIVE = 'archive'
+    ACTION_CHOICES = [
+        (ACTION_CREATE, 'Создание'),
+        (ACTION_UPDATE, 'Изменение'),
+        (ACTION_DELETE, 'Удаление'),
+        (ACTION_ARCHIVE, 'Перенос в архив'),
+    ]
+
+    seq = models.BigAutoField(primary_key=True)
+    record_id = models.UUIDField(db_index=True, verbose_name="ID записи")
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES, verbose_name="Действие")
+    data = models.JSONField(null=True, blank=True, verbose_name="Данные записи")
+    changed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['seq']
+
+    def __str__(self):
+        return f"{self.seq}: {self.action} {self.record_id}"
@@ -0,0 +1,19 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import MedicalRecord, RecordChange
+from .changes import is_suppressed, log_changes
+
+
+@receiver(post_save, sender=MedicalRecord)
+def log_record_save(sender, instance, created, **kwargs):
+    if is_suppressed():
+        return
+    action = RecordChange.ACTION_CREATE if created else RecordChange.ACTION_UPDATE
+    log_changes([instance], action)
+
+
+@receiver(post_delete, sender=MedicalRecord)
+def log_record_delete(sender, instance, **kwargs):
+    if is_suppressed():
+        return
+    log_changes([instance], RecordChange.ACTION_DELETE)
@@ -0,0 +1,75 @@
+import time
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self, ttl=1.0, max_entries=1000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._cache = {}
+        self._stats = {'requests': 0, 'executions': 0, 'coalesced': 0, 'cache_hits': 0}
+
+    def do(self, key, fn):
+        with self._lock:
+            self._stats['requests'] += 1
+            cached = self._cache.get(key)
+            if cached and cached[0] > time.monotonic():
+                self._stats['cache_hits'] += 1
+                return cached[1]
+
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+                self._stats['executions'] += 1
+            else:
+                self._stats['coalesced'] += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+                if call.error is None and self.ttl > 0:
+                    self._store(key, call.value)
+            call.event.set()
+        return call.value
+
+    def _store(self, key, value):
+        now = time.monotonic()
+        if len(self._cache) >= self.max_entries:
+            self._cache = {k: v for k, v in self._cache.items() if v[0] > now}
+            while len(self._cache) >= self.max_entries:
+                del self._cache[next(iter(self._cache))]
+        self._cache[key] = (now + self.ttl, value)
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+            self._stats = dict.fromkeys(self._stats, 0)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        shared = stats['coalesced'] + stats['cache_hits']
+        stats['hit_rate'] = round(shared / stats['requests'], 4) if stats['requests'] else 0
+        return stats
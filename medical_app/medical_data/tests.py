@@ -1,3 +1,771 @@
-from django.test import TestCase
+import os
+import json
+import time
+import uuid
+import queue
+import shutil
+import sqlite3
+import zipfile
+import multiprocessing
+import tempfile
+import threading
+from io import BytesIO, StringIO
+from concurrent.futures import ProcessPoolExecutor
+from unittest import mock
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from .checks import check_json_storage_format
+from .json_store import (
+    get_json_dir, load_record_file, read_json_file, record_filename, write_json_file,
+)
+from .models import MedicalRecord, ArchivedMedicalRecord, RecordChange
+from .singleflight import SingleFlight
+from .views import record_write_queue, search_flight
+from .write_behind import (
+    STATUS_CREATED, STATUS_DUPLICATE, PendingRecord, flush_pending,
+)
 
-# Create your tests here.
+
+def record_data(**overrides):
+    data = {
+        'id': str(uuid.uuid4()),
+        'patient_name': 'Иван Иванов',
+        'age': 35,
+        'gender': 'M',
+        'height': 180.0,
+        'weight': 75.0,
+        'blood_pressure': '120/80',
+        'heart_rate': 72,
+        'temperature': 36.6,
+        'symptoms': 'Головная боль',
+        'diagnosis': 'Мигрень',
+        'created_at': '2025-10-24T11:20:00+00:00',
+    }
+    data.update(overrides)
+    return data
+
+
+def create_record(**overrides):
+    data = record_data(**overrides)
+    data.pop('created_at')
+    return MedicalRecord.objects.create(**data)
+
+
+def form_data(**overrides):
+    data = {
+        'save_location': 'db',
+        'patient_name': 'Иван Иванов',
+        'age': 35,
+        'gender': 'M',
+        'height': 180,
+        'weight': 75,
+        'blood_pressure': '120/80',
+        'heart_rate': 72,
+        'temperature': 36.6,
+        'symptoms': '',
+        'diagnosis': 'Мигрень',
+    }
+    data.update(overrides)
+    return data
+
+
+class MediaRootMixin:
+    def setUp(self):
+        super().setUp()
+        self.tmp_dir = tempfile.mkdtemp()
+        self.settings_override = override_settings(
+            MEDIA_ROOT=os.path.join(self.tmp_dir, 'media'),
+            JSON_RECONCILE_STATE_FILE=os.path.join(self.tmp_dir, 'state.json'),
+        )
+        self.settings_override.enable()
+        os.makedirs(get_json_dir())
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+        super().tearDown()
+
+    def write_record(self, data, storage_format='plain'):
+        name = record_filename(data['id'], storage_format)
+        write_json_file(os.path.join(get_json_dir(), name), data, storage_format)
+        return name
+
+    def call(self, *args, **kwargs):
+        stdout, stderr = StringIO(), StringIO()
+        call_command(*args, stdout=stdout, stderr=stderr, **kwargs)
+        return stdout.getvalue(), stderr.getvalue()
+
+
+class ReconcileJSONStoreTests(MediaRootMixin, TestCase):
+    def test_bad_file_is_counted_and_good_files_are_imported(self):
+        good = record_data()
+        bad = record_data(age='abc')
+        self.write_record(good)
+        bad_name = self.write_record(bad)
+
+        stdout, stderr = self.call('reconcile_json_store')
+
+        self.assertTrue(MedicalRecord.objects.filter(id=good['id']).exists())
+        self.assertFalse(MedicalRecord.objects.filter(id=bad['id']).exists())
+        self.assertIn(bad_name, stderr)
+        self.assertIn('ошибок: 1', stdout)
+
+    def test_second_run_skips_unchanged_files(self):
+        self.write_record(record_data())
+        self.call('reconcile_json_store')
+
+        stdout, _ = self.call('reconcile_json_store')
+
+        self.assertIn('изменено: 0', stdout)
+
+    def test_full_run_does_not_overwrite_db_edits(self):
+        data = record_data()
+        self.write_record(data)
+        self.call('reconcile_json_store')
+        MedicalRecord.objects.filter(id=data['id']).update(diagnosis='Исправлено')
+
+        self.call('reconcile_json_store', full=True)
+
+        self.assertEqual(MedicalRecord.objects.get(id=data['id']).diagnosis, 'Исправлено')
+
+    def test_converted_files_do_not_produce_updates(self):
+        self.write_record(record_data())
+        self.write_record(record_data(patient_name='Петр'))
+        self.call('reconcile_json_store')
+        last_seq = RecordChange.objects.order_by('-seq').values_list('seq', flat=True).first()
+
+        self.call('convert_json_store', format='gzip')
+        self.call('reconcile_json_store')
+
+        self.assertFalse(RecordChange.objects.filter(seq__gt=last_seq).exists())
+
+    def test_missing_file_is_reported(self):
+        data = record_data()
+        name = self.write_record(data)
+        self.call('reconcile_json_store')
+        os.remove(os.path.join(get_json_dir(), name))
+
+        stdout, _ = self.call('reconcile_json_store')
+
+        self.assertIn(f'Нет файла {name}', stdout)
+
+    def test_file_record_without_file_is_reported(self):
+        self.call('reconcile_json_store')
+        record = create_record(data_source='both')
+        db_record = create_record(patient_name='Петр')
+
+        stdout, _ = self.call('reconcile_json_store')
+
+        self.assertIn(f'Нет файла {record_filename(record.id)}', stdout)
+        self.assertNotIn(str(db_record.id), stdout)
+        self.assertIn('Записей без файлов: 1', stdout)
+
+    def test_file_record_is_checked_without_state(self):
+        record = create_record(data_source='file')
+
+        stdout, _ = self.call('reconcile_json_store')
+
+        self.assertIn(f'для записи {record.id}', stdout)
+
+    def test_state_is_saved_once_per_run(self):
+        for name in ('Иван', 'Петр', 'Анна'):
+            self.write_record(record_data(patient_name=name))
+
+        with mock.patch(
+            'medical_data.management.commands.reconcile_json_store.save_state'
+        ) as save_state:
+            self.call('reconcile_json_store', batch_size=1)
+
+        self.assertEqual(save_state.call_count, 1)
+
+
+class JSONStorageTests(MediaRootMixin, TestCase):
+    def test_create_writes_configured_format(self):
+        for storage_format, ext in (('gzip', '.json.gz'), ('lzma', '.json.xz')):
+            with self.subTest(storage_format=storage_format), \
+                    override_settings(JSON_STORAGE_FORMAT=storage_format):
+                patient_name = f'Пациент {storage_format}'
+                response = self.client.post(
+                    reverse('create_record'),
+                    form_data(save_location='both', patient_name=patient_name),
+                )
+
+                self.assertEqual(response.status_code, 302)
+                record = MedicalRecord.objects.get(patient_name=patient_name)
+                path = os.path.join(get_json_dir(), record_filename(record.id, storage_format))
+                self.assertTrue(path.endswith(ext))
+                self.assertEqual(read_json_file(path)['patient_name'], patient_name)
+
+    def test_file_list_reads_plain_and_compressed_files(self):
+        names = [
+            self.write_record(record_data(patient_name=storage_format), storage_format)
+            for storage_format in ('plain', 'gzip', 'lzma')
+        ]
+
+        response = self.client.get(reverse('view_json_files'))
+
+        files = {f['filename']: f['data']['patient_name'] for f in response.context['files']}
+        self.assertEqual(files, dict(zip(names, ('plain', 'gzip', 'lzma'))))
+
+    def test_convert_both_ways_removes_source(self):
+        data = record_data()
+        plain_name = self.write_record(data)
+        gzip_name = record_filename(data['id'], 'gzip')
+
+        stdout, _ = self.call('convert_json_store', format='gzip')
+
+        self.assertIn('Сконвертировано файлов: 1', stdout)
+        self.assertEqual(os.listdir(get_json_dir()), [gzip_name])
+        self.assertEqual(read_json_file(os.path.join(get_json_dir(), gzip_name)), data)
+
+        self.call('convert_json_store', format='plain')
+
+        self.assertEqual(os.listdir(get_json_dir()), [plain_name])
+        self.assertEqual(read_json_file(os.path.join(get_json_dir(), plain_name)), data)
+
+    def test_unknown_storage_format_fails_check(self):
+        self.assertEqual(check_json_storage_format(None), [])
+        with override_settings(JSON_STORAGE_FORMAT='gz'):
+            errors = check_json_storage_format(None)
+        self.assertEqual([e.id for e in errors], ['medical_data.E001'])
+
+
+class SingleFlightTests(TestCase):
+    def wait_for(self, condition):
+        for _ in range(500):
+            if condition():
+                return
+            time.sleep(0.01)
+        self.fail('Условие не выполнено')
+
+    def run_concurrently(self, flight, fn, followers=4):
+        started = threading.Event()
+        release = threading.Event()
+        results, errors = [], []
+
+        def leader_fn():
+            started.set()
+            release.wait(5)
+            return fn()
+
+        def worker(fn):
+            try:
+                results.append(flight.do('key', fn))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=worker, args=(leader_fn,))]
+        threads[0].start()
+        self.assertTrue(started.wait(5))
+        for _ in range(followers):
+            thread = threading.Thread(target=worker, args=(lambda: self.fail('Повторный вызов'),))
+            thread.start()
+            threads.append(thread)
+        self.wait_for(lambda: flight.stats()['coalesced'] == followers)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+        return results, errors
+
+    def test_concurrent_calls_share_one_execution(self):
+        flight = SingleFlight(ttl=0)
+
+        results, errors = self.run_concurrently(flight, lambda: 'result')
+
+        self.assertEqual(results, ['result'] * 5)
+        self.assertEqual(errors, [])
+        stats = flight.stats()
+        self.assertEqual((stats['requests'], stats['executions'], stats['coalesced']), (5, 1, 4))
+
+    def test_followers_receive_leader_error(self):
+        flight = SingleFlight()
+
+        def fail():
+            raise ValueError('ошибка')
+
+        results, errors = self.run_concurrently(flight, fail)
+
+        self.assertEqual(results, [])
+        self.assertEqual([str(e) for e in errors], ['ошибка'] * 5)
+        self.assertEqual(flight.do('key', lambda: 'retry'), 'retry')
+
+    def test_cached_value_expires_after_ttl(self):
+        flight = SingleFlight(ttl=1.0)
+        calls = []
+        with mock.patch('medical_data.singleflight.time.monotonic', return_value=100.0) as clock:
+            flight.do('key', lambda: calls.append(1))
+            clock.return_value = 100.5
+            flight.do('key', lambda: calls.append(2))
+            clock.return_value = 101.5
+            flight.do('key', lambda: calls.append(3))
+
+        self.assertEqual(calls, [1, 3])
+        self.assertEqual(flight.stats()['cache_hits'], 1)
+
+    def test_oldest_entry_is_evicted(self):
+        flight = SingleFlight(ttl=60, max_entries=2)
+        for key in ('a', 'b', 'c'):
+            flight.do(key, lambda: key)
+
+        self.assertEqual(list(flight._cache), ['b', 'c'])
+        self.assertEqual(flight.do('a', lambda: 'again'), 'again')
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        search_flight.clear()
+        self.addCleanup(search_flight.clear)
+
+    def search(self, query):
+        return self.client.get(
+            reverse('search_records'), {'q': query}, HTTP_X_REQUESTED_WITH='XMLHttpRequest'
+        ).json()
+
+    def test_repeated_search_is_served_from_cache(self):
+        create_record(patient_name='Иван Иванов')
+
+        first = self.search('Иван')
+        create_record(patient_name='Иван Петров')
+        second = self.search('  Иван ')
+
+        self.assertEqual(second, first)
+        stats = self.client.get(reverse('search_stats')).json()
+        self.assertEqual(stats, {
+            'requests': 2, 'executions': 1, 'coalesced': 0, 'cache_hits': 1, 'hit_rate': 0.5,
+        })
+
+
+class RecordChangesTests(TestCase):
+    def test_changes_are_paged_in_sequence(self):
+        for i in range(5):
+            create_record(patient_name=f'Пациент {i}')
+
+        response = self.client.get(reverse('record_changes'), {'since': 0, 'limit': 2})
+        page = response.json()
+        self.assertEqual([change['action'] for change in page['changes']], ['create', 'create'])
+        self.assertTrue(page['has_more'])
+
+        seqs = [change['seq'] for change in page['changes']]
+        while page['has_more']:
+            page = self.client.get(
+                reverse('record_changes'), {'since': page['next_since'], 'limit': 2}
+            ).json()
+            seqs.extend(change['seq'] for change in page['changes'])
+
+        self.assertEqual(len(seqs), 5)
+        self.assertEqual(seqs, sorted(seqs))
+
+    def test_delete_is_logged(self):
+        record = create_record()
+
+        self.client.post(reverse('delete_record', args=[record.id]))
+
+        change = RecordChange.objects.order_by('-seq').first()
+        self.assertEqual(change.action, RecordChange.ACTION_DELETE)
+        self.assertEqual(str(change.record_id), str(record.id))
+
+    def test_invalid_since_returns_400(self):
+        response = self.client.get(reverse('record_changes'), {'since': 'x'})
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_record_is_not_saved_when_change_log_fails(self):
+        with mock.patch('medical_data.signals.log_changes', side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                self.client.post(reverse('create_record'), form_data())
+
+        self.assertFalse(MedicalRecord.objects.exists())
+
+
+class ArchiveRecordsTests(MediaRootMixin, TestCase):
+    def archive_file_record(self, storage_format='plain'):
+        data = record_data(created_at='2000-01-01T00:00:00+00:00')
+        self.write_record(data, storage_format)
+        self.call('reconcile_json_store')
+        self.call('archive_records', days=30)
+        return data
+
+    def test_archive_moves_old_records(self):
+        old = create_record()
+        MedicalRecord.objects.filter(id=old.id).update(created_at='2000-01-01T00:00:00+00:00')
+        recent = create_record(patient_name='Петр')
+
+        self.call('archive_records', days=30)
+
+        self.assertFalse(MedicalRecord.objects.filter(id=old.id).exists())
+        self.assertTrue(ArchivedMedicalRecord.objects.filter(id=old.id).exists())
+        self.assertTrue(MedicalRecord.objects.filter(id=recent.id).exists())
+        self.assertEqual(
+            RecordChange.objects.filter(record_id=old.id).last().action,
+            RecordChange.ACTION_ARCHIVE
+        )
+
+    def test_full_reconcile_does_not_restore_archived_record(self):
+        data = self.archive_file_record()
+        os.remove(os.path.join(self.tmp_dir, 'state.json'))
+
+        self.call('reconcile_json_store', full=True)
+
+        self.assertFalse(MedicalRecord.objects.filter(id=data['id']).exists())
+        self.assertTrue(ArchivedMedicalRecord.objects.filter(id=data['id']).exists())
+
+    def test_changed_file_does_not_restore_archived_record(self):
+        data = self.archive_file_record()
+        self.write_record({**data, 'diagnosis': 'Исправлено'}, 'gzip')
+
+        self.call('reconcile_json_store')
+
+        self.assertFalse(MedicalRecord.objects.filter(id=data['id']).exists())
+
+    def test_import_skips_archived_record(self):
+        data = self.archive_file_record()
+        import_dir = os.path.join(self.tmp_dir, 'import')
+        os.makedirs(import_dir)
+        write_json_file(os.path.join(import_dir, 'record.json'), {**data, 'diagnosis': 'Другой'})
+
+        stdout, _ = self.call('import_json_dir', import_dir, workers=1)
+
+        self.assertFalse(MedicalRecord.objects.filter(id=data['id']).exists())
+        self.assertIn('дубликатов 1', stdout)
+
+    def test_archive_search_is_on_demand(self):
+        search_flight.clear()
+        self.addCleanup(search_flight.clear)
+        self.archive_file_record()
+        headers = {'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest'}
+
+        hot = self.client.get(reverse('search_records'), {'q': 'Иван'}, **headers).json()
+        both = self.client.get(reverse('search_records'), {'q': 'Иван', 'archive': '1'}, **headers).json()
+
+        self.assertEqual(hot['results'], [])
+        self.assertEqual([result['archived'] for result in both['results']], [True])
+
+
+class DownloadTests(MediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.data = record_data()
+        self.name = self.write_record(self.data)
+        with open(os.path.join(get_json_dir(), self.name), 'rb') as f:
+            self.content = f.read()
+        self.url = reverse('download_json_file', args=[self.name])
+
+    def test_full_download_has_etag(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertTrue(response['ETag'])
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+
+    def test_if_none_match_returns_304(self):
+        etag = self.client.get(self.url)['ETag']
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+
+    def test_range_requests(self):
+        size = len(self.content)
+        cases = [
+            ('bytes=0-9', self.content[:10], f'bytes 0-9/{size}'),
+            ('bytes=10-', self.content[10:], f'bytes 10-{size - 1}/{size}'),
+            ('bytes=-5', self.content[-5:], f'bytes {size - 5}-{size - 1}/{size}'),
+        ]
+        for header, body, content_range in cases:
+            with self.subTest(header=header):
+                response = self.client.get(self.url, HTTP_RANGE=header)
+                self.assertEqual(response.status_code, 206)
+                self.assertEqual(b''.join(response.streaming_content), body)
+                self.assertEqual(response['Content-Range'], content_range)
+
+    def test_unsatisfiable_range_returns_416(self):
+        response = self.client.get(self.url, HTTP_RANGE=f'bytes={len(self.content)}-')
+
+        self.assertEqual(response.status_code, 416)
+
+    def test_stale_if_range_returns_full_file(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+
+        self.assertEqual(response.status_code, 200)
+
+    def test_path_outside_store_is_rejected(self):
+        response = self.client.get(reverse('download_json_file', args=['..settings.py']))
+
+        self.assertEqual(response.status_code, 404)
+
+    def test_bundle_filters_by_ids(self):
+        self.write_record(record_data(patient_name='Петр'))
+
+        response = self.client.get(reverse('download_json_bundle'), {'ids': self.data['id']})
+
+        with zipfile.ZipFile(BytesIO(b''.join(response.streaming_content))) as archive:
+            self.assertEqual(archive.namelist(), [self.name])
+            self.assertEqual(archive.read(self.name), self.content)
+
+
+class ImportJSONDirTests(MediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.import_dir = os.path.join(self.tmp_dir, 'import')
+        os.makedirs(os.path.join(self.import_dir, 'nested'))
+
+    def write_import_file(self, name, data):
+        write_json_file(os.path.join(self.import_dir, name), data)
+
+    def test_bad_files_are_counted_and_import_completes(self):
+        self.write_import_file('good.json', record_data())
+        self.write_import_file('nested/second.json.gz', record_data(patient_name='Петр'))
+        self.write_import_file('bad_type.json', record_data(age='abc'))
+        self.write_import_file('bad_range.json', record_data(age=-5))
+        with open(os.path.join(self.import_dir, 'broken.json'), 'w') as f:
+            f.write('{')
+
+        stdout, stderr = self.call('import_json_dir', self.import_dir, workers=2)
+
+        self.assertEqual(MedicalRecord.objects.count(), 2)
+        self.assertIn('ошибок 3', stdout)
+        self.assertIn('bad_type.json', stderr)
+        self.assertIn('bad_range.json', stderr)
+
+    def test_resume_skips_processed_files_and_duplicates(self):
+        self.write_import_file('first.json', record_data())
+        self.call('import_json_dir', self.import_dir, workers=1)
+        self.write_import_file('copy.json', record_data())
+        self.write_import_file('new.json', record_data(patient_name='Петр'))
+
+        stdout, _ = self.call('import_json_dir', self.import_dir, workers=1)
+
+        self.assertIn('Файлов к импорту: 2', stdout)
+        self.assertIn('создано 1, дубликатов 1', stdout)
+        self.assertEqual(MedicalRecord.objects.count(), 2)
+
+    def test_worker_runs_under_spawn(self):
+        self.write_import_file('good.json', record_data())
+        self.write_import_file('bad.json', record_data(age='abc'))
+        paths = sorted(
+            os.path.join(self.import_dir, name) for name in ('good.json', 'bad.json')
+        )
+
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+            results = list(executor.map(load_record_file, paths))
+
+        self.assertIsNotNone(results[0][2])
+        self.assertIsNone(results[1][2])
+
+
+class RestoreDataTests(MediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.db_path = os.path.join(self.tmp_dir, 'live.sqlite3')
+        self.backup_dir = os.path.join(self.tmp_dir, 'backup')
+        with sqlite3.connect(self.db_path) as db:
+            db.execute('CREATE TABLE item (id INTEGER PRIMARY KEY, payload TEXT)')
+            db.executemany('INSERT INTO item (payload) VALUES (?)', [('x' * 1000,)] * 2000)
+        db.close()
+        for command in ('backup_data', 'restore_data'):
+            patcher = mock.patch(
+                f'medical_data.management.commands.{command}.get_database_path',
+                return_value=self.db_path,
+            )
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def query(self, sql):
+        db = sqlite3.connect(self.db_path)
+        try:
+            return db.execute(sql).fetchall()
+        finally:
+            db.close()
+
+    def test_backup_and_restore_round_trip(self):
+        name = self.write_record(record_data())
+        record_path = os.path.join(get_json_dir(), name)
+        with open(record_path, 'rb') as f:
+            record_bytes = f.read()
+        self.call('backup_data', output=self.backup_dir)
+
+        with sqlite3.connect(self.db_path) as db:
+            db.execute('DELETE FROM item WHERE id > 10')
+        db.close()
+        write_json_file(record_path, record_data(patient_name='Петр'))
+        extra_path = os.path.join(get_json_dir(), 'extra.json')
+        with open(extra_path, 'w') as f:
+            f.write('{}')
+
+        stdout, _ = self.call('restore_data', self.backup_dir, prune=True)
+
+        self.assertEqual(self.query('SELECT COUNT(*) FROM item'), [(2000,)])
+        with open(record_path, 'rb') as f:
+            self.assertEqual(f.read(), record_bytes)
+        self.assertFalse(os.path.exists(extra_path))
+        self.assertIn('удалено лишних 1', stdout)
+
+    def test_backup_completes_under_concurrent_writes(self):
+        with sqlite3.connect(self.db_path) as db:
+            db.executemany('INSERT INTO item (payload) VALUES (?)', [('x' * 1000,)] * 20000)
+        db.close()
+        stop = threading.Event()
+        commits = []
+
+        def writer():
+            db = sqlite3.connect(self.db_path, timeout=30)
+            deadline = time.monotonic() + 10
+            try:
+                while not stop.is_set() and time.monotonic() < deadline:
+                    with db:
+                        db.execute('INSERT INTO item (payload) VALUES (?)', ('y',))
+                    commits.append(1)
+            finally:
+                db.close()
+
+        thread = threading.Thread(target=writer)
+        thread.start()
+        try:
+            self.wait_for_commits(commits)
+            self.call('backup_data', output=self.backup_dir)
+            finished_while_writing = thread.is_alive()
+        finally:
+            stop.set()
+            thread.join()
+
+        self.assertTrue(finished_while_writing)
+        backup = sqlite3.connect(os.path.join(self.backup_dir, 'db.sqlite3'))
+        try:
+            self.assertEqual(backup.execute('PRAGMA integrity_check').fetchall(), [('ok',)])
+            self.assertGreaterEqual(backup.execute('SELECT COUNT(*) FROM item').fetchone()[0], 2000)
+        finally:
+            backup.close()
+
+    def wait_for_commits(self, commits):
+        for _ in range(500):
+            if commits:
+                return
+            time.sleep(0.01)
+        self.fail('Запись в базу не началась')
+
+    def test_missing_database_file_is_rejected_without_verify(self):
+        os.makedirs(self.backup_dir)
+        manifest = {
+            'created_at': '2025-10-24T11:20:00+00:00',
+            'database': {'path': 'db.sqlite3', 'size': 0, 'sha256': ''},
+            'media': [],
+        }
+        with open(os.path.join(self.backup_dir, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f)
+
+        with self.assertRaisesMessage(CommandError, 'db.sqlite3'):
+            self.call('restore_data', self.backup_dir, no_verify=True)
+
+        self.assertFalse(os.path.exists(os.path.join(self.backup_dir, 'db.sqlite3')))
+        self.assertEqual(self.query('SELECT COUNT(*) FROM item'), [(2000,)])
+
+    def test_manifest_path_outside_media_root_is_rejected(self):
+        backup_dir = os.path.join(self.tmp_dir, 'backup')
+        os.makedirs(os.path.join(backup_dir, 'media'))
+        with open(os.path.join(self.tmp_dir, 'evil.json'), 'w') as f:
+            f.write('{}')
+        manifest = {
+            'created_at': '2025-10-24T11:20:00+00:00',
+            'database': {'path': 'db.sqlite3', 'size': 0, 'sha256': ''},
+            'media': [{'path': '../../evil.json', 'size': 2, 'mtime_ns': 0, 'sha256': ''}],
+        }
+        with open(os.path.join(backup_dir, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f)
+
+        with self.assertRaisesMessage(CommandError, '../../evil.json'):
+            self.call('restore_data', backup_dir, no_verify=True)
+
+
+class WriteBehindTests(MediaRootMixin, TransactionTestCase):
+    def tearDown(self):
+        record_write_queue.close()
+        super().tearDown()
+
+    def post(self, **overrides):
+        return self.client.post(
+            reverse('api_create_record'), json.dumps(form_data(**overrides)),
+            content_type='application/json'
+        )
+
+    def pending(self, **overrides):
+        data = record_data(**overrides)
+        data.pop('created_at')
+        return PendingRecord(MedicalRecord(**data), data)
+
+    def test_duplicates_are_resolved_within_batch_and_against_db(self):
+        create_record(patient_name='Петр')
+        batch = [self.pending(), self.pending(), self.pending(patient_name='Петр')]
+
+        with self.assertLogs('medical_data.write_behind', 'WARNING') as logs:
+            flush_pending(batch)
+
+        self.assertEqual(len(logs.records), 2)
+        self.assertEqual(
+            [pending.status for pending in batch],
+            [STATUS_CREATED, STATUS_DUPLICATE, STATUS_DUPLICATE]
+        )
+        self.assertEqual(MedicalRecord.objects.count(), 2)
+        self.assertTrue(all(pending.event.is_set() for pending in batch))
+
+    def test_file_error_does_not_fail_committed_records(self):
+        batch = [self.pending(), self.pending(patient_name='Петр')]
+
+        with mock.patch('medical_data.write_behind.write_record_file', side_effect=OSError), \
+                self.assertLogs('medical_data.write_behind', 'ERROR'):
+            flush_pending(batch)
+
+        self.assertEqual([pending.status for pending in batch], [STATUS_CREATED, STATUS_CREATED])
+
+    def test_inline_create_and_duplicate(self):
+        self.assertEqual(self.post().status_code, 201)
+        with self.assertLogs('medical_data.write_behind', 'WARNING'):
+            self.assertEqual(self.post().status_code, 409)
+        self.assertEqual(self.post(age=-1).status_code, 400)
+
+    def test_non_json_content_type_is_rejected(self):
+        response = self.client.post(reverse('api_create_record'), form_data())
+
+        self.assertEqual(response.status_code, 415)
+        self.assertFalse(MedicalRecord.objects.exists())
+
+    @override_settings(RECORD_WRITE_BEHIND=True, RECORD_WRITE_BEHIND_ACK='commit')
+    def test_commit_ack_waits_for_group_commit(self):
+        response = self.post(save_location='both')
+
+        self.assertEqual(response.status_code, 201)
+        record_id = response.json()['id']
+        self.assertTrue(MedicalRecord.objects.filter(id=record_id).exists())
+        self.assertTrue(os.path.exists(os.path.join(get_json_dir(), record_filename(record_id))))
+        with self.assertLogs('medical_data.write_behind', 'WARNING'):
+            self.assertEqual(self.post(save_location='both').status_code, 409)
+
+    @override_settings(RECORD_WRITE_BEHIND=True, RECORD_WRITE_BEHIND_ACK='queued')
+    def test_queued_ack_is_flushed_on_close(self):
+        response = self.post()
+
+        self.assertEqual(response.status_code, 202)
+        record_write_queue.close()
+        self.assertTrue(MedicalRecord.objects.filter(id=response.json()['id']).exists())
+
+    @override_settings(RECORD_WRITE_BEHIND=True, RECORD_WRITE_BEHIND_ACK='queued')
+    def test_queued_duplicate_is_logged(self):
+        create_record()
+
+        with self.assertLogs('medical_data.write_behind', 'WARNING') as logs:
+            response = self.post()
+            record_write_queue.close()
+
+        self.assertEqual(response.status_code, 202)
+        self.assertIn(response.json()['id'], logs.output[0])
+        self.assertEqual(MedicalRecord.objects.count(), 1)
+
+    @override_settings(RECORD_WRITE_BEHIND=True, RECORD_WRITE_BEHIND_ACK='queued')
+    def test_full_queue_returns_503(self):
+        with mock.patch.object(record_write_queue, 'submit', side_effect=queue.Full):
+            response = self.post()
+
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(MedicalRecord.objects.exists())
@@ -6,8 +6,14 @@ urlpatterns = [
     path('create/', views.create_medical_record, name='create_record'),
     path('upload/', views.upload_json_file, name='upload_json'),
     path('files/', views.view_json_files, name='view_json_files'),
+    path('files/bundle/', views.download_json_bundle, name='download_json_bundle'),
+    path('files/<str:filename>/download/', views.download_json_file, name='download_json_file'),
+    path('uploads/<uuid:file_id>/download/', views.download_uploaded_file, name='download_uploaded_file'),
     path('records/', views.view_medical_records, name='view_records'),
     path('search/', views.search_records, name='search_records'),
+    path('search/stats/', views.search_stats, name='search_stats'),
     path('edit/<uuid:record_id>/', views.edit_record, name='edit_record'),
     path('delete/<uuid:record_id>/', views.delete_record, name='delete_record'),
+    path('changes/', views.record_changes, name='record_changes'),
+    path('api/records/', views.api_create_record, name='api_create_record'),
 ]
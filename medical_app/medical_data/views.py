@@ -1,15 +1,31 @@
 import os
 import json
 import uuid
+import queue
+from datetime import datetime, time
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import JsonResponse
+from django.http import Http404, HttpResponse, JsonResponse
 from django.conf import settings
 from django.contrib import messages
 from django.utils import timezone
-from django.db import IntegrityError
+from django.utils.dateparse import parse_date
+from django.db import IntegrityError, transaction
 from django.db.models import Q
+from django.core.serializers.json import DjangoJSONEncoder
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 from .forms import MedicalRecordForm, JSONUploadForm, MedicalRecordEditForm
-from .models import MedicalRecord, JSONFile
+from .models import MedicalRecord, ArchivedMedicalRecord, JSONFile, RecordChange
+from .changes import change_to_dict
+from .singleflight import SingleFlight
+from .downloads import serve_file, serve_zip
+from .write_behind import (
+    STATUS_CREATED, STATUS_DUPLICATE, PendingRecord, WriteBehindQueue, flush_pending,
+)
+from .json_store import (
+    JSON_READ_ERRORS, RECORD_FIELDS, get_json_dir, is_json_filename, read_json_file,
+    record_id_from_filename, record_kwargs, write_record_file,
+)
 
 def home(request):
     return render(request, 'medical_data/home.html')
@@ -57,11 +73,12 @@ def create_medical_record(request):
             db_saved = False
             if save_location in ['db', 'both'] and not duplicate:
                 try:
-                    MedicalRecord.objects.create(
-                        id=record_id,
-                        **record_data,
-                        data_source='db' if save_location == 'db' else 'both'
-                    )
+                    with transaction.atomic():
+                        MedicalRecord.objects.create(
+                            id=record_id,
+                            **record_data,
+                            data_source='db' if save_location == 'db' else 'both'
+                        )
                     db_saved = True
                     messages.success(request, 'Запись сохранена в базу данных!')
                 except IntegrityError:
@@ -69,14 +86,7 @@ def create_medical_record(request):
             
             file_saved = False
             if save_location in ['file', 'both']:
-                json_dir = os.path.join(settings.MEDIA_ROOT, 'medical_json')
-                os.makedirs(json_dir, exist_ok=True)
-                
-                filename = f"medical_record_{record_id}.json"
-                filepath = os.path.join(json_dir, filename)
-                
-                with open(filepath, 'w', encoding='utf-8') as f:
-                    json.dump(json_data, f, ensure_ascii=False, indent=2)
+                filename = write_record_file(json_data)
                 
                 file_saved = True
                 messages.success(request, f'Запись сохранена в файл: {filename}')
@@ -120,23 +130,24 @@ def upload_json_file(request):
                     return redirect('upload_json')
                 
                 json_file.is_valid = True
-                json_file.save()
-                
-                MedicalRecord.objects.create(
-                    id=uuid.uuid4(),
-                    patient_name=data['patient_name'],
-                    age=data['age'],
-                    gender=data['gender'],
-                    height=data['height'],
-                    weight=data['weight'],
-                    blood_pressure=data.get('blood_pressure', ''),
-                    heart_rate=data.get('heart_rate', 0),
-                    temperature=data.get('temperature', 36.6),
-                    symptoms=data.get('symptoms', ''),
-                    diagnosis=data.get('diagnosis', ''),
-                    data_source='file',
-                    created_at=timezone.now()
-                )
+                with transaction.atomic():
+                    json_file.save()
+                    
+                    MedicalRecord.objects.create(
+                        id=uuid.uuid4(),
+                        patient_name=data['patient_name'],
+                        age=data['age'],
+                        gender=data['gender'],
+                        height=data['height'],
+                        weight=data['weight'],
+                        blood_pressure=data.get('blood_pressure', ''),
+                        heart_rate=data.get('heart_rate', 0),
+                        temperature=data.get('temperature', 36.6),
+                        symptoms=data.get('symptoms', ''),
+                        diagnosis=data.get('diagnosis', ''),
+                        data_source='file',
+                        created_at=timezone.now()
+                    )
                 
                 messages.success(request, 'Файл успешно загружен и проверен!')
                 
@@ -153,7 +164,7 @@ def upload_json_file(request):
     return render(request, 'medical_data/upload_json.html', {'form': form})
 
 def view_json_files(request):
-    json_dir = os.path.join(settings.MEDIA_ROOT, 'medical_json')
+    json_dir = get_json_dir()
     
     if not os.path.exists(json_dir):
         messages.info(request, 'Папка с JSON файлами не существует.')
@@ -162,18 +173,17 @@ def view_json_files(request):
     json_files = []
     try:
         for filename in os.listdir(json_dir):
-            if filename.endswith('.json'):
+            if is_json_filename(filename):
                 filepath = os.path.join(json_dir, filename)
                 try:
-                    with open(filepath, 'r', encoding='utf-8') as f:
-                        data = json.load(f)
-                        json_files.append({
-                            'filename': filename,
-                            'data': data,
-                            'filepath': filepath,
-                            'size': os.path.getsize(filepath)
-                        })
-                except (json.JSONDecodeError, UnicodeDecodeError):
+                    data = read_json_file(filepath)
+                    json_files.append({
+                        'filename': filename,
+                        'data': data,
+                        'filepath': filepath,
+                        'size': os.path.getsize(filepath)
+                    })
+                except JSON_READ_ERRORS:
                     continue
     except FileNotFoundError:
         messages.info(request, 'Папка с JSON файлами не найдена.')
@@ -183,6 +193,56 @@ def view_json_files(request):
     
     return render(request, 'medical_data/view_files.html', {'files': json_files})
 
+def json_file_path(filename):
+    if filename != os.path.basename(filename) or not is_json_filename(filename):
+        raise Http404
+    filepath = os.path.join(get_json_dir(), filename)
+    if not os.path.isfile(filepath):
+        raise Http404
+    return filepath
+
+def download_json_file(request, filename):
+    return serve_file(request, json_file_path(filename), filename)
+
+def download_uploaded_file(request, file_id):
+    json_file = get_object_or_404(JSONFile, id=file_id)
+    if not json_file.file or not os.path.isfile(json_file.file.path):
+        raise Http404
+    return serve_file(request, json_file.file.path, os.path.basename(json_file.file.name))
+
+def download_json_bundle(request):
+    json_dir = get_json_dir()
+    if not os.path.isdir(json_dir):
+        raise Http404
+    
+    record_ids = set()
+    for value in request.GET.get('ids', '').split(','):
+        if value.strip():
+            try:
+                record_ids.add(uuid.UUID(value.strip()))
+            except ValueError:
+                return JsonResponse({'error': f'Некорректный ID записи: {value}'}, status=400)
+    
+    since = None
+    if request.GET.get('since'):
+        since_date = parse_date(request.GET['since'])
+        if since_date is None:
+            return JsonResponse({'error': 'Параметр since должен быть датой в формате ГГГГ-ММ-ДД'}, status=400)
+        since = timezone.make_aware(datetime.combine(since_date, time.min)).timestamp()
+    
+    paths = []
+    with os.scandir(json_dir) as entries:
+        for entry in entries:
+            if not entry.is_file() or not is_json_filename(entry.name):
+                continue
+            if record_ids and record_id_from_filename(entry.name) not in record_ids:
+                continue
+            if since is not None and entry.stat().st_mtime < since:
+                continue
+            paths.append(entry.path)
+    
+    return serve_zip(sorted(paths), 'medical_json.zip')
+
 def view_medical_records(request):
     data_source = request.GET.get('source', 'db')
     
@@ -195,39 +255,63 @@ def view_medical_records(request):
             'data_source': data_source
         })
 
+def record_to_result(record, archived=False):
+    return {
+        'id': str(record.id),
+        'patient_name': record.patient_name,
+        'age': record.age,
+        'gender': record.get_gender_display(),
+        'height': record.height,
+        'weight': record.weight,
+        'blood_pressure': record.blood_pressure,
+        'heart_rate': record.heart_rate,
+        'temperature': record.temperature,
+        'symptoms': record.symptoms,
+        'diagnosis': record.diagnosis,
+        'bmi': record.bmi,
+        'created_at': record.created_at.strftime('%d.%m.%Y %H:%M'),
+        'archived': archived
+    }
+
+def search_filter(query):
+    return (
+        Q(patient_name__icontains=query) |
+        Q(symptoms__icontains=query) |
+        Q(diagnosis__icontains=query) |
+        Q(blood_pressure__icontains=query)
+    )
+
+search_flight = SingleFlight(
+    ttl=settings.SEARCH_CACHE_TTL,
+    max_entries=settings.SEARCH_CACHE_MAX_ENTRIES
+)
+
+def run_search(query, include_archive):
+    records = MedicalRecord.objects.filter(search_filter(query)).order_by('-created_at')
+    results = [record_to_result(record) for record in records]
+    
+    if include_archive:
+        archived = ArchivedMedicalRecord.objects.filter(search_filter(query)).order_by('-created_at')
+        results.extend(record_to_result(record, archived=True) for record in archived)
+    
+    return json.dumps({'results': results}, cls=DjangoJSONEncoder)
+
 def search_records(request):
     if request.headers.get('x-requested-with') == 'XMLHttpRequest':
-        query = request.GET.get('q', '')
+        query = ' '.join(request.GET.get('q', '').split())
         if query:
-            records = MedicalRecord.objects.filter(
-                Q(patient_name__icontains=query) |
-                Q(symptoms__icontains=query) |
-                Q(diagnosis__icontains=query) |
-                Q(blood_pressure__icontains=query)
-            ).order_by('-created_at')
-            
-            results = []
-            for record in records:
-                results.append({
-                    'id': str(record.id),
-                    'patient_name': record.patient_name,
-                    'age': record.age,
-                    'gender': record.get_gender_display(),
-                    'height': record.height,
-                    'weight': record.weight,
-                    'blood_pressure': record.blood_pressure,
-                    'heart_rate': record.heart_rate,
-                    'temperature': record.temperature,
-                    'symptoms': record.symptoms,
-                    'diagnosis': record.diagnosis,
-                    'bmi': record.bmi,
-                    'created_at': record.created_at.strftime('%d.%m.%Y %H:%M')
-                })
-            
-            return JsonResponse({'results': results})
+            include_archive = request.GET.get('archive') == '1'
+            content = search_flight.do(
+                (query, include_archive),
+                lambda: run_search(query, include_archive)
+            )
+            return HttpResponse(content, content_type='application/json')
     
     return JsonResponse({'results': []})
 
+def search_stats(request):
+    return JsonResponse(search_flight.stats())
+
 def edit_record(request, record_id):
     record = get_object_or_404(MedicalRecord, id=record_id)
     
@@ -246,7 +330,8 @@ def edit_record(request, record_id):
             if duplicate:
                 messages.error(request, 'Такая запись уже существует!')
             else:
-                form.save()
+                with transaction.atomic():
+                    form.save()
                 messages.success(request, 'Запись успешно обновлена!')
                 return redirect('view_records')
     else:
@@ -266,3 +351,85 @@ def delete_record(request, record_id):
         return redirect('view_records')
     
     return render(request, 'medical_data/delete_record.html', {'record': record})
+
+CHANGES_DEFAULT_LIMIT = 100
+CHANGES_MAX_LIMIT = 1000
+
+def record_changes(request):
+    try:
+        since = int(request.GET.get('since', 0))
+        limit = int(request.GET.get('limit', CHANGES_DEFAULT_LIMIT))
+    except ValueError:
+        return JsonResponse({'error': 'Параметры since и limit должны быть целыми числами'}, status=400)
+    
+    limit = max(1, min(limit, CHANGES_MAX_LIMIT))
+    changes = list(RecordChange.objects.filter(seq__gt=since).order_by('seq')[:limit + 1])
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+    
+    return JsonResponse({
+        'changes': [change_to_dict(change) for change in changes],
+        'next_since': changes[-1].seq if changes else since,
+        'has_more': has_more
+    })
+
+record_write_queue = WriteBehindQueue(
+    batch_size=settings.RECORD_WRITE_BEHIND_BATCH_SIZE,
+    max_delay=settings.RECORD_WRITE_BEHIND_MAX_DELAY,
+    max_size=settings.RECORD_WRITE_BEHIND_QUEUE_SIZE
+)
+
+@csrf_exempt
+@require_POST
+def api_create_record(request):
+    if request.content_type != 'application/json':
+        return JsonResponse({'error': 'Ожидался Content-Type: application/json'}, status=415)
+    try:
+        payload = json.loads(request.body)
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return JsonResponse({'error': 'Некорректный JSON'}, status=400)
+    if not isinstance(payload, dict):
+        return JsonResponse({'error': 'Ожидался JSON объект'}, status=400)
+    
+    form = MedicalRecordForm({'save_location': 'db', **payload})
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+    
+    save_location = form.cleaned_data['save_location']
+    record_id = uuid.uuid4()
+    json_data = {
+        'id': str(record_id),
+        **{field: form.cleaned_data[field] for field in RECORD_FIELDS},
+        'created_at': timezone.now().isoformat()
+    }
+    
+    if save_location == 'file':
+        write_record_file(json_data)
+        return JsonResponse({'id': str(record_id), 'status': STATUS_CREATED}, status=201)
+    
+    pending = PendingRecord(
+        MedicalRecord(
+            id=record_id,
+            data_source='db' if save_location == 'db' else 'both',
+            **record_kwargs(json_data)
+        ),
+        json_data if save_location == 'both' else None
+    )
+    
+    if not settings.RECORD_WRITE_BEHIND:
+        flush_pending([pending])
+    else:
+        try:
+            record_write_queue.submit(pending)
+        except queue.Full:
+            return JsonResponse({'error': 'Очередь записи переполнена, повторите позже'}, status=503)
+        if settings.RECORD_WRITE_BEHIND_ACK == 'queued':
+            return JsonResponse({'id': str(record_id), 'status': 'queued'}, status=202)
+        if not pending.wait(settings.RECORD_WRITE_BEHIND_ACK_TIMEOUT):
+            return JsonResponse({'id': str(record_id), 'status': 'pending'}, status=503)
+    
+    if pending.status == STATUS_DUPLICATE:
+        return JsonResponse({'error': 'Такая запись уже существует в базе данных!'}, status=409)
+    if pending.status != STATUS_CREATED:
+        return JsonResponse({'error': 'Ошибка при сохранении в базу данных!'}, status=503)
+    return JsonResponse({'id': str(record_id), 'status': STATUS_CREATED}, status=201)
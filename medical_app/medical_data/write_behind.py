@@ -0,0 +1,128 @@
+import time
+import queue
+import atexit
+import logging
+import threading
+from django.db import close_old_connections, transaction
+from .changes import log_changes
+from .json_store import DUPLICATE_FIELDS, duplicate_key, write_record_file
+from .models import MedicalRecord, RecordChange
+
+logger = logging.getLogger(__name__)
+
+STATUS_PENDING = 'pending'
+STATUS_CREATED = 'created'
+STATUS_DUPLICATE = 'duplicate'
+STATUS_ERROR = 'error'
+
+
+class PendingRecord:
+    def __init__(self, record, json_data=None):
+        self.record = record
+        self.json_data = json_data
+        self.status = STATUS_PENDING
+        self.error = None
+        self.event = threading.Event()
+
+    def wait(self, timeout=None):
+        return self.event.wait(timeout)
+
+
+def flush_pending(batch):
+    try:
+        existing_keys = set(MedicalRecord.objects.filter(
+            patient_name__in={pending.record.patient_name for pending in batch}
+        ).values_list(*DUPLICATE_FIELDS))
+
+        seen_keys = set()
+        new = []
+        for pending in batch:
+            key = duplicate_key(pending.record)
+            if key in existing_keys or key in seen_keys:
+                pending.status = STATUS_DUPLICATE
+                logger.warning('Запись %s отклонена как дубликат', pending.record.id)
+                continue
+            seen_keys.add(key)
+            new.append(pending)
+
+        with transaction.atomic():
+            MedicalRecord.objects.bulk_create([pending.record for pending in new])
+            log_changes([pending.record for pending in new], RecordChange.ACTION_CREATE)
+    except Exception as e:
+        logger.exception('Не удалось записать пакет из %d записей', len(batch))
+        for pending in batch:
+            if pending.status == STATUS_PENDING:
+                pending.status = STATUS_ERROR
+                pending.error = e
+        for pending in batch:
+            pending.event.set()
+        return
+
+    for pending in new:
+        pending.status = STATUS_CREATED
+
+    try:
+        for pending in new:
+            if pending.json_data is None:
+                continue
+            try:
+                write_record_file(pending.json_data)
+            except OSError:
+                logger.exception('Не удалось записать файл для записи %s', pending.record.id)
+    finally:
+        for pending in batch:
+            pending.event.set()
+
+
+class WriteBehindQueue:
+    def __init__(self, batch_size=100, max_delay=0.005, max_size=10000):
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self._queue = queue.Queue(maxsize=max_size)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._atexit_registered = False
+
+    def submit(self, pending):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name='record-write-behind', daemon=True
+                )
+                self._thread.start()
+                if not self._atexit_registered:
+                    atexit.register(self.close)
+                    self._atexit_registered = True
+        self._queue.put_nowait(pending)
+        return pending
+
+    def close(self, timeout=10):
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if thread is not None and thread.is_alive():
+            self._queue.put(None)
+            thread.join(timeout)
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is None:
+                break
+
+            batch = [first]
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                try:
+                    pending = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if pending is None:
+                    stopping = True
+                    break
+                batch.append(pending)
+
+            flush_pending(batch)
+            close_old_connections()